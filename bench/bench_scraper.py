@@ -0,0 +1,147 @@
+"""
+離線爬蟲基準測試：對本機 fixture server 執行 fetch_latest_threads_posts，
+量測延遲、Playwright / Chromium 行程的記憶體峰值，並核對擷取結果。
+
+用法：python bench/bench_scraper.py [--runs N] [--settle-ms MS] [fixture ...]
+任一 fixture 擷取結果不符時以 exit code 1 結束，可作為回歸測試。
+記憶體量測讀取 /proc，僅支援 Linux；其他平台顯示為 "-"。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from threads_fixture_server import HEAVY_PINNED_COUNT, heavy_post_ids, start_fixture_server
+from threads_scraper import fetch_latest_threads_posts
+
+USERNAME = "benchuser"
+
+# fixture → 預期結果；None 表示爬蟲應回傳 None
+EXPECTED: dict[str, dict | None] = {
+    "logged_in": {
+        "post_ids": ["PINNED01", "POST0002", "POST0003", "POST0004", "POST0005"],
+        "pinned": ["PINNED01"],
+    },
+    "heavy": {
+        "post_ids": heavy_post_ids()[:10],
+        "pinned": heavy_post_ids()[:HEAVY_PINNED_COUNT],
+    },
+    "empty": None,
+    "login_wall": None,
+}
+
+
+def _descendant_rss_bytes(root_pid: int) -> int | None:
+    """加總 root_pid 所有子孫行程的 RSS（即 Playwright driver 與 Chromium）。"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+    children: dict[int, list[int]] = {}
+    rss_pages: dict[int, int] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            statm = (entry / "statm").read_text()
+        except OSError:
+            continue
+        # comm 可能含空白，從最後一個 ')' 之後開始切
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        pid = int(entry.name)
+        children.setdefault(ppid, []).append(pid)
+        rss_pages[pid] = int(statm.split()[1])
+    total = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total * os.sysconf("SC_PAGE_SIZE")
+
+
+async def _sample_peak_rss(stop: asyncio.Event, peak: list[int]):
+    while not stop.is_set():
+        rss = _descendant_rss_bytes(os.getpid())
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+        await asyncio.sleep(0.05)
+
+
+def _check(result: list[dict] | None, expected: dict | None) -> str | None:
+    """回傳錯誤說明，結果正確時回傳 None。"""
+    if expected is None:
+        return None if result is None else f"預期 None，實際取得 {len(result)} 則"
+    if result is None:
+        return "預期取得貼文，實際回傳 None"
+    ids = [r["post_id"] for r in result]
+    pinned = [r["post_id"] for r in result if r["pinned"]]
+    if ids != expected["post_ids"]:
+        return f"post_ids 不符：{ids}"
+    if pinned != expected["pinned"]:
+        return f"置頂不符：{pinned}"
+    return None
+
+
+async def bench_fixture(base_url: str, fixture: str, runs: int, settle_ms: int) -> dict:
+    latencies: list[float] = []
+    peak = [0]
+    error = None
+    for _ in range(runs):
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(_sample_peak_rss(stop, peak))
+        start = time.perf_counter()
+        result = await fetch_latest_threads_posts(
+            USERNAME,
+            profile_url=f"{base_url}/{fixture}/@{USERNAME}",
+            settle_ms=settle_ms,
+        )
+        latencies.append(time.perf_counter() - start)
+        stop.set()
+        await sampler
+        error = error or _check(result, EXPECTED[fixture])
+    return {
+        "fixture": fixture,
+        "median_s": statistics.median(latencies),
+        "max_s": max(latencies),
+        "peak_rss_mb": peak[0] / 1024 / 1024 if peak[0] else None,
+        "error": error,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Threads 爬蟲離線基準測試")
+    parser.add_argument("fixtures", nargs="*", help=f"預設全部：{', '.join(EXPECTED)}")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--settle-ms", type=int, default=3_000)
+    args = parser.parse_args()
+    fixtures = args.fixtures or list(EXPECTED)
+    unknown = [f for f in fixtures if f not in EXPECTED]
+    if unknown:
+        parser.error(f"未知的 fixture：{', '.join(unknown)}")
+
+    server, base_url = start_fixture_server()
+    try:
+        reports = [
+            await bench_fixture(base_url, f, args.runs, args.settle_ms) for f in fixtures
+        ]
+    finally:
+        server.shutdown()
+
+    print(f"\n{'fixture':<12} {'median(s)':>10} {'max(s)':>8} {'peak RSS(MB)':>13}  結果")
+    for r in reports:
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        status = "OK" if r["error"] is None else f"FAIL：{r['error']}"
+        print(f"{r['fixture']:<12} {r['median_s']:>10.2f} {r['max_s']:>8.2f} {rss:>13}  {status}")
+
+    if any(r["error"] for r in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
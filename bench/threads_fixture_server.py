@@ -0,0 +1,101 @@
+"""
+本機 Threads fixture server：提供存檔的個人頁面，讓爬蟲可以離線測試與量測。
+
+路由：
+  /<fixture>/@<username>   回傳 fixtures/<fixture>.html
+  /login_wall/@<username>  302 轉址到 /accounts/login/（模擬登入牆）
+  /heavy/@<username>       動態產生含大量貼文與他人引用連結的頁面
+
+單獨執行：python bench/threads_fixture_server.py [port]
+之後把 bot 的 THREADS_PROFILE_URL 設為 http://127.0.0.1:<port>/logged_in/@{username}
+"""
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+HEAVY_POST_COUNT = 300
+HEAVY_PINNED_COUNT = 2
+
+
+def heavy_post_ids(count: int = HEAVY_POST_COUNT) -> list[str]:
+    return [f"HEAVY{i:04d}" for i in range(count)]
+
+
+def heavy_profile_html(username: str, count: int = HEAVY_POST_COUNT) -> str:
+    """產生大量貼文的個人頁；前 HEAVY_PINNED_COUNT 則為置頂，每則都帶一個他人引用連結。"""
+    parts = []
+    for i, pid in enumerate(heavy_post_ids(count)):
+        badge = '<div class="badge"><span>Pinned</span></div>' if i < HEAVY_PINNED_COUNT else ""
+        parts.append(
+            f'<article class="post">{badge}'
+            f'<div class="header"><a href="/@{username}">{username}</a>'
+            f'<a href="/@{username}/post/{pid}"><time>{i}h</time></a></div>'
+            f'<div class="body"><a href="/@{username}/post/{pid}">貼文 {i} '
+            + "內容 " * 40
+            + f'</a><div class="quote"><a href="/@quoted{i}/post/Q{i:04d}">@quoted{i}</a></div>'
+            f"</div></article>"
+        )
+    return (
+        '<!DOCTYPE html><html lang="zh-TW"><head><meta charset="utf-8">'
+        f"<title>{username} (@{username}) • Threads</title></head><body>"
+        f'<main class="feed">{"".join(parts)}</main></body></html>'
+    )
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/accounts/login"):
+            self._send_html((FIXTURES_DIR / "login.html").read_text(encoding="utf-8"))
+            return
+
+        parts = path.strip("/").split("/")
+        if len(parts) != 2 or not parts[1].startswith("@"):
+            self.send_error(404)
+            return
+        fixture, username = parts[0], parts[1][1:]
+
+        if fixture == "login_wall":
+            self.send_response(302)
+            self.send_header("Location", f"/accounts/login/?next=/@{username}")
+            self.end_headers()
+            return
+        if fixture == "heavy":
+            self._send_html(heavy_profile_html(username))
+            return
+
+        file = FIXTURES_DIR / f"{fixture}.html"
+        if not file.is_file():
+            self.send_error(404)
+            return
+        self._send_html(file.read_text(encoding="utf-8"))
+
+    def _send_html(self, html: str):
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(port: int = 0) -> tuple[ThreadingHTTPServer, str]:
+    """在背景執行緒啟動 server，回傳 (server, base_url)；port=0 表示自動選擇。"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server = ThreadingHTTPServer(("127.0.0.1", port), _FixtureHandler)
+    print(f"Fixture server：http://127.0.0.1:{port}/<fixture>/@<username>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,13 +1,25 @@
 import os
 import json
 import re
-from datetime import datetime, timezone
+import time
+import asyncio
+import bisect
+import io
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 import discord
 from discord import app_commands
 from discord.ext import tasks
 import aiosqlite
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright
+from threads_scraper import fetch_latest_threads_posts
+from loop_profiler import (
+    LoopStallDetector,
+    format_collapsed,
+    sample_stacks,
+    top_functions,
+    top_task_stacks,
+)
 
 load_dotenv()
 
@@ -19,6 +31,14 @@ DB_PATH              = os.getenv("DB_PATH", "./track.db")
 THREADS_USERNAME     = os.getenv("THREADS_USERNAME", "")
 THREADS_CHANNEL_ID   = os.getenv("THREADS_CHANNEL_ID", "")
 THREADS_COOKIES_PATH = os.getenv("THREADS_COOKIES_PATH", "./threads_cookies.json")
+THREADS_PROFILE_URL  = os.getenv("THREADS_PROFILE_URL", "https://www.threads.net/@{username}")
+TREND_CHANNEL_ID     = os.getenv("TREND_CHANNEL_ID", "")
+TREND_SHORT_MINUTES  = int(os.getenv("TREND_SHORT_MINUTES", "5"))
+TREND_LONG_MINUTES   = int(os.getenv("TREND_LONG_MINUTES", "60"))
+TREND_RATIO          = float(os.getenv("TREND_RATIO", "3.0"))
+TREND_MIN_COUNT      = int(os.getenv("TREND_MIN_COUNT", "5"))
+TREND_COOLDOWN_MINUTES = int(os.getenv("TREND_COOLDOWN_MINUTES", "30"))
+STALL_THRESHOLD_MS   = int(os.getenv("STALL_THRESHOLD_MS", "500"))
 
 intents = discord.Intents.default()
 intents.message_content = True
@@ -28,57 +48,318 @@ tree = app_commands.CommandTree(client)
 
 # ---------- DB ----------
 
+# ── schema migrations ──
+# 每個版本只執行一次，完成後寫入 PRAGMA user_version。
+# 只能在尾端新增版本，不可修改已發佈的 migration。
+
+async def _migration_1_base_schema(db: aiosqlite.Connection):
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS rules_keywords (
+        guild_id TEXT,
+        keyword  TEXT,
+        PRIMARY KEY (guild_id, keyword)
+    )
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        id               INTEGER PRIMARY KEY AUTOINCREMENT,
+        guild_id         TEXT,
+        channel_id       TEXT,
+        message_id       TEXT,
+        author_id        TEXT,
+        author_tag       TEXT,
+        created_at       TEXT,
+        content          TEXT,
+        matched_keywords TEXT,
+        stickers         TEXT,
+        emojis           TEXT,
+        jump_url         TEXT
+    )
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS threads_state (
+        username      TEXT PRIMARY KEY,
+        seen_ids      TEXT NOT NULL DEFAULT '[]',
+        init_seen_ids TEXT NOT NULL DEFAULT '[]'
+    )
+    """)
+    # 舊版 threads_state 缺少欄位時直接補上，保留既有狀態
+    cur = await db.execute("PRAGMA table_info(threads_state)")
+    cols = {row[1] for row in await cur.fetchall()}
+    for col in ("seen_ids", "init_seen_ids"):
+        if col not in cols:
+            await db.execute(
+                f"ALTER TABLE threads_state ADD COLUMN {col} TEXT NOT NULL DEFAULT '[]'"
+            )
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS keyword_counts (
+        guild_id    TEXT,
+        author_id   TEXT,
+        author_tag  TEXT,
+        keyword     TEXT,
+        count       INTEGER NOT NULL DEFAULT 0,
+        last_seen_at TEXT,
+        PRIMARY KEY (guild_id, author_id, keyword)
+    )
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS app_state (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+
+
+async def _migration_2_media_usage(db: aiosqlite.Connection):
+    cur = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='emoji_usage'"
+    )
+    usage_is_new = await cur.fetchone() is None
+    # bucket 為 UTC 日期（YYYY-MM-DD）
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS emoji_usage (
+        guild_id  TEXT,
+        author_id TEXT,
+        bucket    TEXT,
+        emoji     TEXT,
+        count     INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, bucket, emoji, author_id)
+    )
+    """)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS sticker_usage (
+        guild_id     TEXT,
+        author_id    TEXT,
+        bucket       TEXT,
+        sticker_id   TEXT,
+        sticker_name TEXT,
+        count        INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (guild_id, bucket, sticker_id, author_id)
+    )
+    """)
+    if usage_is_new:
+        await enqueue_logs_migration(db, "usage_backfill")
+
+
+async def _migration_3_logs_message_id_index(db: aiosqlite.Connection):
+    # 注意：在大型 logs 表上建索引需掃描整張表，期間持有寫入鎖（數 GB 可能需數分鐘）。
+    # 訊息事件會等 db_ready 後才寫入，不會因 "database is locked" 遺失；
+    # 但此期間的 slash 指令若需寫入資料庫仍可能逾時失敗。
+    # 每則訊息只能有一筆 log；UNIQUE 讓 on_message 與編輯事件以 INSERT 搶先登記，避免重複計數。
+    # 建立前先移除舊資料中重複的 message_id（保留最早的一筆），
+    # 並扣回這些重複列當初累加的關鍵字與貼圖 / emoji 計數（尚未回填的列不曾計入用量）。
+    db.row_factory = aiosqlite.Row
+    cur = await db.execute("""
+    SELECT l.id, l.guild_id, l.author_id, l.created_at, l.matched_keywords, l.stickers, l.emojis
+    FROM logs l
+    JOIN (
+        SELECT message_id, MIN(id) AS keep_id FROM logs
+        GROUP BY message_id HAVING COUNT(*) > 1
+    ) d ON l.message_id = d.message_id AND l.id <> d.keep_id
+    """)
+    duplicates = await cur.fetchall()
+    if duplicates:
+        backfill_range = await pending_logs_migration_range(db, "usage_backfill")
+        count_deltas: Counter = Counter()
+        emoji_deltas: Counter = Counter()
+        sticker_deltas: Counter = Counter()
+        for row in duplicates:
+            g, a = row["guild_id"], row["author_id"]
+            for k in set(json.loads(row["matched_keywords"] or "[]")):
+                count_deltas[(g, a, k)] -= 1
+            if _awaiting_usage_backfill(row["id"], backfill_range):
+                continue
+            bucket = (row["created_at"] or "")[:10]
+            for e in json.loads(row["emojis"] or "[]"):
+                emoji_deltas[(g, a, bucket, e)] -= 1
+            for st in json.loads(row["stickers"] or "[]"):
+                sticker_deltas[(g, a, bucket, st["id"])] -= 1
+        await _apply_keyword_count_deltas(db, count_deltas, {})
+        await _apply_media_usage_deltas(db, emoji_deltas, sticker_deltas)
+        await db.executemany(
+            "DELETE FROM logs WHERE id=?", [(row["id"],) for row in duplicates]
+        )
+    print(f"[DB] 移除重複 message_id 的 log 列 {len(duplicates)} 筆")
+    db.row_factory = None
+    await db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_logs_message_id ON logs (message_id)"
+    )
+
+
+# (版本, 說明, migration 函式)
+SCHEMA_MIGRATIONS = [
+    (1, "基本資料表", _migration_1_base_schema),
+    (2, "貼圖 / emoji 用量統計表", _migration_2_media_usage),
+    (3, "logs.message_id 索引", _migration_3_logs_message_id_index),
+]
+
+
 async def init_db():
     async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS rules_keywords (
-            guild_id TEXT,
-            keyword  TEXT,
-            PRIMARY KEY (guild_id, keyword)
-        )
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS logs (
-            id               INTEGER PRIMARY KEY AUTOINCREMENT,
-            guild_id         TEXT,
-            channel_id       TEXT,
-            message_id       TEXT,
-            author_id        TEXT,
-            author_tag       TEXT,
-            created_at       TEXT,
-            content          TEXT,
-            matched_keywords TEXT,
-            stickers         TEXT,
-            emojis           TEXT,
-            jump_url         TEXT
-        )
-        """)
-        # Migration：舊版欄位不符時自動重建
-        cur = await db.execute("PRAGMA table_info(threads_state)")
-        cols = [row[1] for row in await cur.fetchall()]
-        if cols and "init_seen_ids" not in cols:
-            await db.execute("DROP TABLE threads_state")
+        # WAL 讓背景批次遷移寫入時，讀取與訊息記錄不會被擋住
+        await db.execute("PRAGMA journal_mode=WAL")
+        cur = await db.execute("PRAGMA user_version")
+        (current,) = await cur.fetchone()
+        for version, description, migrate in SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"[DB] 套用 schema migration v{version}：{description}")
+            await db.execute("BEGIN")
+            try:
+                await migrate(db)
+                await db.execute(f"PRAGMA user_version = {version}")
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+
+# schema migration 完成前，訊息事件先等待，避免長時間的遷移讓寫入逾時而遺失計數
+db_ready = asyncio.Event()
+
+
+# ── online logs migrations ──
+# 大型 logs 表的資料搬移不在啟動時一次完成，而是由 schema migration 登記，
+# 之後在背景依 id 分批執行。登記當下記錄 MAX(id) 作為上限，
+# 之後寫入的列由新的寫入路徑處理；進度存在 app_state，中斷後可接續。
+
+async def enqueue_logs_migration(db: aiosqlite.Connection, name: str):
+    """在 schema migration 的 transaction 內登記一個背景批次遷移。"""
+    cur = await db.execute("SELECT COALESCE(MAX(id), 0) FROM logs")
+    (max_id,) = await cur.fetchone()
+    await db.executemany(
+        "INSERT OR REPLACE INTO app_state (key, value) VALUES (?,?)",
+        [(f"{name}_until", str(max_id)), (f"{name}_last_id", "0")],
+    )
+
+
+async def pending_logs_migration_range(
+    db: aiosqlite.Connection, name: str
+) -> tuple[int, int] | None:
+    """回傳背景遷移尚未處理的 id 範圍 (last_id, until]；已完成或未登記時回傳 None。"""
+    cur = await db.execute(
+        "SELECT key, value FROM app_state WHERE key IN (?, ?)",
+        (f"{name}_until", f"{name}_last_id"),
+    )
+    state = dict(await cur.fetchall())
+    if f"{name}_until" not in state:
+        return None
+    until = int(state[f"{name}_until"])
+    last_id = int(state.get(f"{name}_last_id", "0"))
+    return (last_id, until) if last_id < until else None
+
+
+async def run_logs_migration(name: str, apply_batch, batch_size: int = 500):
+    """
+    依 id 分批將 logs 的列交給 apply_batch(db, rows) 處理。
+    每批以 BEGIN IMMEDIATE 讀取並寫回，資料與進度在同一個 transaction 內提交，
+    讓同時修改 logs 的編輯 / 刪除事件能以進度判斷該列是否已處理；批次之間讓出事件迴圈。
+    """
+    async with aiosqlite.connect(DB_PATH) as db:
+        pending = await pending_logs_migration_range(db, name)
+    if pending is None:
+        return
+    last_id, until = pending
+
+    print(f"[DB] 開始背景遷移 {name}（id {last_id + 1}–{until}）")
+    while last_id < until:
+        async with aiosqlite.connect(DB_PATH) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute("BEGIN IMMEDIATE")
+            cur = await db.execute(
+                "SELECT * FROM logs WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (last_id, until, batch_size),
+            )
+            rows = await cur.fetchall()
+            if rows:
+                await apply_batch(db, rows)
+                last_id = rows[-1]["id"]
+            else:
+                last_id = until
+            await db.execute(
+                "UPDATE app_state SET value=? WHERE key=?",
+                (str(last_id), f"{name}_last_id"),
+            )
             await db.commit()
+        await asyncio.sleep(0.05)  # 讓出事件迴圈給其他工作
+    print(f"[DB] 背景遷移 {name} 完成")
 
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS threads_state (
-            username      TEXT PRIMARY KEY,
-            seen_ids      TEXT NOT NULL DEFAULT '[]',
-            init_seen_ids TEXT NOT NULL DEFAULT '[]'
-        )
-        """)
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS keyword_counts (
-            guild_id    TEXT,
-            author_id   TEXT,
-            author_tag  TEXT,
-            keyword     TEXT,
-            count       INTEGER NOT NULL DEFAULT 0,
-            last_seen_at TEXT,
-            PRIMARY KEY (guild_id, author_id, keyword)
-        )
-        """)
-        await db.commit()
+
+# ── keyword index ──
+
+class KeywordIndex:
+    """
+    各伺服器追蹤關鍵字的記憶體快取，以 (小寫, 原字串) 排序存放，
+    前綴查詢用 bisect，供自動完成與訊息比對使用，不必每次查詢資料庫。
+    載入與寫入資料庫後的更新需持有同一個伺服器的 lock，
+    以免載入中的舊查詢結果蓋掉剛新增 / 移除的關鍵字。
+    """
+
+    def __init__(self):
+        self._entries: dict[str, list[tuple[str, str]]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def lock(self, guild_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(guild_id, asyncio.Lock())
+
+    def is_loaded(self, guild_id: str) -> bool:
+        return guild_id in self._entries
+
+    def load(self, guild_id: str, keywords: list[str]):
+        self._entries[guild_id] = sorted((k.lower(), k) for k in keywords)
+
+    def add(self, guild_id: str, keyword: str):
+        entries = self._entries.get(guild_id)
+        if entries is None:
+            return  # 尚未載入，下次載入時會從資料庫取得
+        entry = (keyword.lower(), keyword)
+        i = bisect.bisect_left(entries, entry)
+        if i == len(entries) or entries[i] != entry:
+            entries.insert(i, entry)
+
+    def remove(self, guild_id: str, keyword: str):
+        entries = self._entries.get(guild_id)
+        if entries is None:
+            return
+        entry = (keyword.lower(), keyword)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def keywords(self, guild_id: str) -> list[str]:
+        return [k for _, k in self._entries.get(guild_id, [])]
+
+    def search(self, guild_id: str, query: str, limit: int = 25) -> list[str]:
+        """前綴相符者優先（短的在前），不足 limit 時再補上包含 query 的關鍵字。"""
+        entries = self._entries.get(guild_id, [])
+        q = query.strip().lower()
+        if not q:
+            return [k for _, k in entries[:limit]]
+
+        prefix: list[str] = []
+        i = bisect.bisect_left(entries, (q,))
+        while i < len(entries) and entries[i][0].startswith(q):
+            prefix.append(entries[i][1])
+            i += 1
+        prefix.sort(key=len)
+        if len(prefix) >= limit:
+            return prefix[:limit]
+
+        substring = [k for lower, k in entries if q in lower and not lower.startswith(q)]
+        substring.sort(key=lambda k: (k.lower().index(q), len(k)))
+        return (prefix + substring)[:limit]
+
+
+keyword_index = KeywordIndex()
+
+
+async def get_cached_keywords(guild_id: str) -> list[str]:
+    """從快取取得關鍵字；該伺服器第一次查詢時才讀資料庫。"""
+    if not keyword_index.is_loaded(guild_id):
+        async with keyword_index.lock(guild_id):
+            if not keyword_index.is_loaded(guild_id):
+                keyword_index.load(guild_id, await get_keywords(guild_id))
+    return keyword_index.keywords(guild_id)
 
 
 # ── keyword helpers ──
@@ -96,47 +377,217 @@ async def add_keyword(guild_id: str, keyword: str):
     keyword = keyword.strip()
     if not keyword:
         return
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO rules_keywords (guild_id, keyword) VALUES (?,?)",
-            (guild_id, keyword),
-        )
-        await db.commit()
+    async with keyword_index.lock(guild_id):
+        async with aiosqlite.connect(DB_PATH) as db:
+            await db.execute(
+                "INSERT OR IGNORE INTO rules_keywords (guild_id, keyword) VALUES (?,?)",
+                (guild_id, keyword),
+            )
+            await db.commit()
+        keyword_index.add(guild_id, keyword)
 
 
 async def remove_keyword(guild_id: str, keyword: str):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "DELETE FROM rules_keywords WHERE guild_id=? AND keyword=?",
-            (guild_id, keyword),
-        )
-        await db.commit()
+    async with keyword_index.lock(guild_id):
+        async with aiosqlite.connect(DB_PATH) as db:
+            await db.execute(
+                "DELETE FROM rules_keywords WHERE guild_id=? AND keyword=?",
+                (guild_id, keyword),
+            )
+            await db.commit()
+        keyword_index.remove(guild_id, keyword)
+
+
+async def import_keywords(
+    guild_id: str, to_add: list[str], to_remove: list[str]
+):
+    """在單一 transaction 內批次新增 / 移除關鍵字，完成後一次重建快取。"""
+    async with keyword_index.lock(guild_id):
+        async with aiosqlite.connect(DB_PATH) as db:
+            if to_add:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO rules_keywords (guild_id, keyword) VALUES (?,?)",
+                    [(guild_id, k) for k in to_add],
+                )
+            if to_remove:
+                await db.executemany(
+                    "DELETE FROM rules_keywords WHERE guild_id=? AND keyword=?",
+                    [(guild_id, k) for k in to_remove],
+                )
+            await db.commit()
+        keyword_index.load(guild_id, await get_keywords(guild_id))
+    for k in to_remove:
+        trend_detector.forget(guild_id, k)
 
 
-async def insert_log(**kwargs):
+async def record_message(
+    *,
+    guild_id: str,
+    channel_id: str,
+    message_id: str,
+    author_id: str,
+    author_tag: str,
+    created_at: str,
+    content: str,
+    matched: list[str],
+    stickers: list[dict],
+    emojis: list[str],
+    jump_url: str,
+) -> bool:
+    """
+    在單一 transaction 內登記 log 列並累加關鍵字與貼圖 / emoji 計數。
+    同一 message_id 已有記錄時（例如編輯事件已搶先登記）不做任何事並回傳 False，
+    log 列與計數因此永遠一起成立，編輯 / 刪除事件不會插在兩者之間。
+    """
     async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
+        await db.execute("BEGIN IMMEDIATE")
+        cur = await db.execute(
             """
             INSERT INTO logs (
                 guild_id, channel_id, message_id, author_id, author_tag,
                 created_at, content, matched_keywords, stickers, emojis, jump_url
             ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
+            ON CONFLICT(message_id) DO NOTHING
             """,
             (
-                kwargs["guild_id"],
-                kwargs["channel_id"],
-                kwargs["message_id"],
-                kwargs["author_id"],
-                kwargs["author_tag"],
-                kwargs["created_at"],
-                kwargs["content"],
-                kwargs["matched_keywords"],
-                kwargs["stickers"],
-                kwargs["emojis"],
-                kwargs["jump_url"],
+                guild_id,
+                channel_id,
+                message_id,
+                author_id,
+                author_tag,
+                created_at,
+                content,
+                json.dumps(matched, ensure_ascii=False),
+                json.dumps(stickers, ensure_ascii=False),
+                json.dumps(emojis, ensure_ascii=False),
+                jump_url,
             ),
         )
+        if cur.rowcount != 1:
+            await db.rollback()
+            return False
+
+        await _apply_keyword_count_deltas(
+            db, Counter((guild_id, author_id, k) for k in matched), {author_id: author_tag}
+        )
+        emoji_rows, sticker_rows = _usage_rows(
+            guild_id, author_id, created_at[:10], stickers, emojis
+        )
+        if emoji_rows:
+            await db.executemany(_EMOJI_UPSERT_SQL, emoji_rows)
+        if sticker_rows:
+            await db.executemany(_STICKER_UPSERT_SQL, sticker_rows)
         await db.commit()
+    return True
+
+
+# ── sticker / emoji usage helpers ──
+
+_EMOJI_UPSERT_SQL = """
+    INSERT INTO emoji_usage (guild_id, author_id, bucket, emoji, count)
+    VALUES (?,?,?,?,?)
+    ON CONFLICT(guild_id, bucket, emoji, author_id) DO UPDATE SET
+        count = count + excluded.count
+"""
+
+_STICKER_UPSERT_SQL = """
+    INSERT INTO sticker_usage (guild_id, author_id, bucket, sticker_id, sticker_name, count)
+    VALUES (?,?,?,?,?,?)
+    ON CONFLICT(guild_id, bucket, sticker_id, author_id) DO UPDATE SET
+        count        = count + excluded.count,
+        sticker_name = excluded.sticker_name
+"""
+
+
+def _usage_rows(
+    guild_id: str, author_id: str, bucket: str, stickers: list[dict], emojis: list[str]
+) -> tuple[list[tuple], list[tuple]]:
+    """將單則訊息的貼圖 / emoji 整理成 upsert 參數（同一則訊息內重複者合併計數）。"""
+    emoji_rows = [
+        (guild_id, author_id, bucket, e, n) for e, n in Counter(emojis).items()
+    ]
+    names = {st["id"]: st["name"] for st in stickers}
+    sticker_rows = [
+        (guild_id, author_id, bucket, sid, names[sid], n)
+        for sid, n in Counter(st["id"] for st in stickers).items()
+    ]
+    return emoji_rows, sticker_rows
+
+
+async def get_media_usage(
+    guild_id: str,
+    since_bucket: str | None = None,
+    author_id: str | None = None,
+    top_n: int = 10,
+) -> tuple[list[tuple[str, int]], list[tuple[str, int]]]:
+    """回傳 (emoji 排行, 貼圖排行)，皆為 [(名稱, 次數), ...]，依次數 DESC 排序。"""
+    conditions: list[str] = ["guild_id = ?"]
+    params: list = [guild_id]
+    if since_bucket is not None:
+        conditions.append("bucket >= ?")
+        params.append(since_bucket)
+    if author_id is not None:
+        conditions.append("author_id = ?")
+        params.append(author_id)
+    where = " AND ".join(conditions)
+    async with aiosqlite.connect(DB_PATH) as db:
+        # 依 emoji id 合併（改名、<a:…> 動態形式皆算同一個），名稱取最近一天的寫法；
+        # SQLite 在有 MAX() 的聚合中，裸欄位 emoji 會取自 bucket 最大的那一列
+        cur = await db.execute(
+            f"""
+            SELECT emoji, MAX(bucket), SUM(count) AS total FROM emoji_usage
+            WHERE {where}
+            GROUP BY rtrim(substr(emoji, length(rtrim(emoji, '0123456789>')) + 1), '>')
+            ORDER BY total DESC LIMIT ?
+            """,
+            [*params, top_n],
+        )
+        emoji_rows = [(r[0], r[2]) for r in await cur.fetchall()]
+        cur = await db.execute(
+            f"""
+            SELECT MAX(sticker_name), SUM(count) AS total FROM sticker_usage
+            WHERE {where} GROUP BY sticker_id ORDER BY total DESC LIMIT ?
+            """,
+            [*params, top_n],
+        )
+        sticker_rows = await cur.fetchall()
+    return emoji_rows, [(r[0], r[1]) for r in sticker_rows]
+
+
+async def _backfill_media_usage_batch(db: aiosqlite.Connection, rows: list):
+    """背景遷移 usage_backfill：將既有 logs 的 stickers / emojis JSON 回填到用量統計表。"""
+    emoji_rows: list[tuple] = []
+    sticker_rows: list[tuple] = []
+    for row in rows:
+        try:
+            stickers = json.loads(row["stickers"] or "[]")
+            emojis = json.loads(row["emojis"] or "[]")
+        except json.JSONDecodeError:
+            continue
+        e_rows, s_rows = _usage_rows(
+            row["guild_id"], row["author_id"], (row["created_at"] or "")[:10], stickers, emojis
+        )
+        emoji_rows.extend(e_rows)
+        sticker_rows.extend(s_rows)
+    if emoji_rows:
+        await db.executemany(_EMOJI_UPSERT_SQL, emoji_rows)
+    if sticker_rows:
+        await db.executemany(_STICKER_UPSERT_SQL, sticker_rows)
+
+
+# (名稱, 批次處理函式)；依序執行，名稱需與 enqueue_logs_migration 一致
+LOGS_MIGRATIONS = [
+    ("usage_backfill", _backfill_media_usage_batch),
+]
+
+
+async def run_pending_logs_migrations():
+    for name, apply_batch in LOGS_MIGRATIONS:
+        try:
+            await run_logs_migration(name, apply_batch)
+        except Exception as e:
+            print(f"[DB] 背景遷移 {name} 失敗（下次啟動時接續）：{e}")
+            return
 
 
 # ── threads state helpers ──
@@ -187,25 +638,6 @@ async def add_threads_seen_ids(username: str, new_ids: list[str]):
 
 # ── keyword count helpers ──
 
-async def increment_keyword_count(
-    guild_id: str, author_id: str, author_tag: str, keyword: str
-):
-    ts = now_iso()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """
-            INSERT INTO keyword_counts (guild_id, author_id, author_tag, keyword, count, last_seen_at)
-            VALUES (?,?,?,?,1,?)
-            ON CONFLICT(guild_id, author_id, keyword) DO UPDATE SET
-                count        = count + 1,
-                author_tag   = excluded.author_tag,
-                last_seen_at = excluded.last_seen_at
-            """,
-            (guild_id, author_id, author_tag, keyword, ts),
-        )
-        await db.commit()
-
-
 async def set_keyword_count(
     guild_id: str, author_id: str, author_tag: str, keyword: str, new_count: int
 ):
@@ -304,6 +736,223 @@ async def get_keyword_counts(
     ]
 
 
+# ── message edit / delete helpers ──
+
+_LOG_LOOKUP_BATCH = 500
+
+
+async def _apply_keyword_count_deltas(
+    db: aiosqlite.Connection, deltas: Counter, author_tags: dict[str, str]
+):
+    """deltas 以 (guild_id, author_id, keyword) 為 key；扣到 0 的列會一併移除。"""
+    ts = now_iso()
+    increments = [
+        (g, a, author_tags.get(a, ""), k, d, ts) for (g, a, k), d in deltas.items() if d > 0
+    ]
+    decrements = [(-d, g, a, k) for (g, a, k), d in deltas.items() if d < 0]
+    if increments:
+        await db.executemany(
+            """
+            INSERT INTO keyword_counts (guild_id, author_id, author_tag, keyword, count, last_seen_at)
+            VALUES (?,?,?,?,?,?)
+            ON CONFLICT(guild_id, author_id, keyword) DO UPDATE SET
+                count        = count + excluded.count,
+                author_tag   = excluded.author_tag,
+                last_seen_at = excluded.last_seen_at
+            """,
+            increments,
+        )
+    if decrements:
+        await db.executemany(
+            """
+            UPDATE keyword_counts SET count = MAX(count - ?, 0)
+            WHERE guild_id=? AND author_id=? AND keyword=?
+            """,
+            decrements,
+        )
+        # 扣到 0 的列直接移除，避免排行與 /track_stats 出現 0 次的項目
+        await db.executemany(
+            """
+            DELETE FROM keyword_counts
+            WHERE guild_id=? AND author_id=? AND keyword=? AND count <= 0
+            """,
+            [key for _, *key in decrements],
+        )
+
+
+async def _apply_media_usage_deltas(
+    db: aiosqlite.Connection, emoji_deltas: Counter, sticker_deltas: Counter
+):
+    """
+    emoji_deltas 以 (guild_id, author_id, bucket, emoji) 為 key；貼圖無法編輯新增，只會扣減。
+    扣到 0 的列會一併移除。
+    """
+    increments = [key + (d,) for key, d in emoji_deltas.items() if d > 0]
+    if increments:
+        await db.executemany(_EMOJI_UPSERT_SQL, increments)
+    emoji_decrements = [(-d,) + key for key, d in emoji_deltas.items() if d < 0]
+    if emoji_decrements:
+        await db.executemany(
+            """
+            UPDATE emoji_usage SET count = MAX(count - ?, 0)
+            WHERE guild_id=? AND author_id=? AND bucket=? AND emoji=?
+            """,
+            emoji_decrements,
+        )
+        await db.executemany(
+            """
+            DELETE FROM emoji_usage
+            WHERE guild_id=? AND author_id=? AND bucket=? AND emoji=? AND count <= 0
+            """,
+            [key for _, *key in emoji_decrements],
+        )
+    sticker_decrements = [(-d,) + key for key, d in sticker_deltas.items() if d < 0]
+    if sticker_decrements:
+        await db.executemany(
+            """
+            UPDATE sticker_usage SET count = MAX(count - ?, 0)
+            WHERE guild_id=? AND author_id=? AND bucket=? AND sticker_id=?
+            """,
+            sticker_decrements,
+        )
+        await db.executemany(
+            """
+            DELETE FROM sticker_usage
+            WHERE guild_id=? AND author_id=? AND bucket=? AND sticker_id=? AND count <= 0
+            """,
+            [key for _, *key in sticker_decrements],
+        )
+
+
+def _awaiting_usage_backfill(log_id: int, pending: tuple[int, int] | None) -> bool:
+    return pending is not None and pending[0] < log_id <= pending[1]
+
+
+async def apply_message_edit(
+    guild_id: str, message_id: str, content: str, new_matched: list[str]
+) -> bool:
+    """
+    依 message_id 找出原本的 log 列，只套用關鍵字與 emoji 的差異並更新該列。
+    找不到 log 列時回傳 False（原訊息未被記錄）；內容未變動時不做任何事。
+    """
+    new_emojis = extract_custom_emojis(content)
+    select_row = """
+        SELECT id, author_id, author_tag, created_at, content, matched_keywords, emojis
+        FROM logs WHERE message_id=?
+    """
+    async with aiosqlite.connect(DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        # 先以一般讀取確認；未記錄的訊息與內容未變的編輯（例如連結預覽展開）
+        # 在此直接結束，不必取得寫入鎖
+        cur = await db.execute(select_row, (message_id,))
+        rows = await cur.fetchall()
+        if not rows:
+            return False
+        if rows[0]["content"] == content:
+            return True
+
+        # 與背景回填及其他寫入互斥後重新讀取，確保回填進度與 log 列一致
+        await db.execute("BEGIN IMMEDIATE")
+        cur = await db.execute(select_row, (message_id,))
+        rows = await cur.fetchall()
+        if not rows or rows[0]["content"] == content:
+            await db.rollback()
+            return True  # 期間已被刪除或已套用相同內容
+        row = rows[0]
+
+        author_id = row["author_id"]
+        bucket = (row["created_at"] or "")[:10]
+        old_matched = set(json.loads(row["matched_keywords"] or "[]"))
+        old_emojis = Counter(json.loads(row["emojis"] or "[]"))
+
+        count_deltas: Counter = Counter()
+        for k in set(new_matched) - old_matched:
+            count_deltas[(guild_id, author_id, k)] += 1
+        for k in old_matched - set(new_matched):
+            count_deltas[(guild_id, author_id, k)] -= 1
+        new_emoji_counts = Counter(new_emojis)
+        emoji_deltas: Counter = Counter()
+        for e in new_emoji_counts.keys() | old_emojis.keys():
+            d = new_emoji_counts[e] - old_emojis[e]
+            if d:
+                emoji_deltas[(guild_id, author_id, bucket, e)] = d
+
+        await _apply_keyword_count_deltas(db, count_deltas, {author_id: row["author_tag"]})
+        # 尚未回填的列之後會由回填讀取更新後的內容，此時套用差異會重複計算
+        backfill_range = await pending_logs_migration_range(db, "usage_backfill")
+        if not _awaiting_usage_backfill(row["id"], backfill_range):
+            await _apply_media_usage_deltas(db, emoji_deltas, Counter())
+        await db.execute(
+            "UPDATE logs SET content=?, matched_keywords=?, emojis=? WHERE id=?",
+            (
+                content,
+                json.dumps(new_matched, ensure_ascii=False),
+                json.dumps(new_emojis, ensure_ascii=False),
+                row["id"],
+            ),
+        )
+        await db.commit()
+    return True
+
+
+async def delete_logged_messages(message_ids: list[str]) -> int:
+    """
+    刪除訊息對應的 log 列並扣回其關鍵字與貼圖 / emoji 計數，回傳刪除筆數。
+    大量刪除時以 IN 分批查詢，所有變更在單一 transaction 內提交。
+    """
+    count_deltas: Counter = Counter()
+    emoji_deltas: Counter = Counter()
+    sticker_deltas: Counter = Counter()
+    log_ids: list[tuple[int]] = []
+    async with aiosqlite.connect(DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        # 先以一般讀取找出有記錄的訊息；多數刪除的訊息從未被記錄，不必取得寫入鎖
+        logged: list[str] = []
+        for i in range(0, len(message_ids), _LOG_LOOKUP_BATCH):
+            chunk = message_ids[i:i + _LOG_LOOKUP_BATCH]
+            cur = await db.execute(
+                f"SELECT message_id FROM logs WHERE message_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            logged.extend(r["message_id"] for r in await cur.fetchall())
+        if not logged:
+            return 0
+
+        # 取得寫入鎖後重新讀取，確保回填進度與 log 列一致
+        await db.execute("BEGIN IMMEDIATE")
+        backfill_range = await pending_logs_migration_range(db, "usage_backfill")
+        for i in range(0, len(logged), _LOG_LOOKUP_BATCH):
+            chunk = logged[i:i + _LOG_LOOKUP_BATCH]
+            cur = await db.execute(
+                f"""
+                SELECT id, guild_id, author_id, created_at, matched_keywords, stickers, emojis
+                FROM logs WHERE message_id IN ({",".join("?" * len(chunk))})
+                """,
+                chunk,
+            )
+            for row in await cur.fetchall():
+                g, a = row["guild_id"], row["author_id"]
+                bucket = (row["created_at"] or "")[:10]
+                for k in set(json.loads(row["matched_keywords"] or "[]")):
+                    count_deltas[(g, a, k)] -= 1
+                log_ids.append((row["id"],))
+                # 尚未回填的列從未計入用量統計，不可扣減
+                if _awaiting_usage_backfill(row["id"], backfill_range):
+                    continue
+                for e in json.loads(row["emojis"] or "[]"):
+                    emoji_deltas[(g, a, bucket, e)] -= 1
+                for st in json.loads(row["stickers"] or "[]"):
+                    sticker_deltas[(g, a, bucket, st["id"])] -= 1
+        if not log_ids:
+            await db.rollback()
+            return 0
+        await _apply_keyword_count_deltas(db, count_deltas, {})
+        await _apply_media_usage_deltas(db, emoji_deltas, sticker_deltas)
+        await db.executemany("DELETE FROM logs WHERE id=?", log_ids)
+        await db.commit()
+    return len(log_ids)
+
+
 # ---------- Helpers ----------
 
 _CUSTOM_EMOJI_RE = re.compile(r"<a?:\w+:\d+>")
@@ -313,117 +962,158 @@ def extract_custom_emojis(text: str) -> list[str]:
     return _CUSTOM_EMOJI_RE.findall(text)
 
 
+def match_keywords(keywords: list[str], content: str) -> list[str]:
+    content_lower = content.lower()
+    return [k for k in keywords if k.lower() in content_lower]
+
+
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-# ---------- Threads Scraping ----------
+# ---------- Trend Detection ----------
 
-async def fetch_latest_threads_posts(username: str) -> list[dict] | None:
+class KeywordTrendDetector:
     """
-    使用 Playwright 抓取 Threads 公開個人頁面的最新貼文（前 5 則）。
-    回傳 [{"post_id": str, "url": str, "text": str}, ...] 或 None（失敗時）。
-    回傳多則是為了跳過置頂貼文。
+    以每分鐘一格的環狀緩衝區記錄 (guild_id, keyword) 的出現次數，
+    比較短窗口平均速率與長窗口（扣除短窗口）的基準速率。
+    每個 key 只佔固定 long_buckets 格，純記憶體運算，不查詢資料庫。
     """
-    profile_url = f"https://www.threads.net/@{username}"
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        try:
-            context = await browser.new_context(
-                user_agent=(
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/124.0.0.0 Safari/537.36"
-                ),
-                locale="zh-TW",
-            )
-            # 載入已儲存的登入 Cookie
-            if os.path.exists(THREADS_COOKIES_PATH):
-                with open(THREADS_COOKIES_PATH, encoding="utf-8") as f:
-                    await context.add_cookies(json.load(f))
-                print(f"[Threads] 已載入 Cookie：{THREADS_COOKIES_PATH}")
-            else:
-                print("[Threads] 未找到 Cookie 檔案，以未登入狀態嘗試")
-
-            page = await context.new_page()
-            await page.goto(profile_url, wait_until="networkidle", timeout=30_000)
-            await page.wait_for_timeout(3_000)
-
-            final_url = page.url
-            print(f"[Threads] 最終頁面 URL：{final_url}")
-
-            # 登入牆偵測
-            if any(k in final_url for k in ("login", "accounts", "signup")):
-                print("[Threads] 偵測到登入牆，無法在未登入狀態下查看此頁面")
-                return None
-
-            # 從 DOM 取得貼文清單，同時偵測置頂標記
-            # 將 username 傳入 JS，只抓屬於該用戶的貼文連結
-            raw: list[dict] = await page.evaluate("""
-                (username) => {
-                    const userPattern = '/@' + username + '/post/';
-
-                    function isPinned(linkEl) {
-                        let el = linkEl;
-                        for (let i = 0; i < 8; i++) {
-                            if (!el.parentElement) break;
-                            el = el.parentElement;
-                            // 超過單篇容器就停
-                            if (el.querySelectorAll('a[href*="/post/"]').length > 3) break;
-                            // 偵測 "Pinned" 文字節點
-                            const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
-                            let node;
-                            while ((node = walker.nextNode())) {
-                                const t = node.textContent?.trim();
-                                if (t === 'Pinned' || t === '置頂') return true;
-                            }
-                            // 偵測 aria-label
-                            for (const a of el.querySelectorAll('[aria-label]')) {
-                                if (a.getAttribute('aria-label').toLowerCase().includes('pin')) return true;
-                            }
-                        }
-                        return false;
-                    }
-
-                    const seen = new Set();
-                    const results = [];
-                    for (const link of document.querySelectorAll('a[href*="/post/"]')) {
-                        // 只保留屬於此用戶的貼文連結，排除回覆、引用等其他用戶的連結
-                        if (!link.href.includes(userPattern)) continue;
-                        const m = link.href.match(/\\/post\\/([^/?#]+)/);
-                        if (!m) continue;
-                        const pid = m[1];
-                        if (seen.has(pid)) continue;
-                        seen.add(pid);
-                        results.push({ pid, pinned: isPinned(link) });
-                        if (results.length >= 10) break;
-                    }
-                    return results;
-                }
-            """, username)
-
-            if not raw:
-                page_title = await page.title()
-                print(f"[Threads] 找不到貼文連結，頁面標題：{page_title!r}")
-                return None
-
-            results: list[dict] = []
-            for item in raw:
-                pid: str = item["pid"]
-                pinned: bool = item["pinned"]
-                # 過濾掉非此用戶的貼文（若有的話）
-                clean_url = f"https://www.threads.com/@{username}/post/{pid}"
-                results.append({"post_id": pid, "url": clean_url, "pinned": pinned})
-
-            pinned_ids = [r["post_id"] for r in results if r["pinned"]]
-            print(f"[Threads] 共 {len(results)} 則，置頂：{pinned_ids}")
-            return results
 
-        except Exception as e:
-            print(f"[Threads] 抓取 @{username} 失敗：{e}")
+    def __init__(
+        self,
+        short_minutes: int,
+        long_minutes: int,
+        ratio: float,
+        min_count: int,
+        cooldown_minutes: int,
+        bucket_seconds: int = 60,
+    ):
+        if short_minutes < 1 or long_minutes <= short_minutes:
+            raise ValueError("趨勢偵測窗口設定錯誤：需 0 < short < long")
+        self.short_buckets = short_minutes
+        self.long_buckets = long_minutes
+        self.ratio = ratio
+        self.min_count = min_count
+        self.cooldown_seconds = cooldown_minutes * 60
+        self.bucket_seconds = bucket_seconds
+        self._rings: dict[tuple[str, str], list[int]] = {}
+        self._last_tick: dict[tuple[str, str], int] = {}
+        self._last_alert: dict[tuple[str, str], float] = {}
+        self._started_at = time.time()
+
+    def _advance(self, key: tuple[str, str], tick: int) -> list[int]:
+        """將 key 的環狀緩衝區推進到 tick，清空中間經過的格子。"""
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = [0] * self.long_buckets
+            self._rings[key] = ring
+            self._last_tick[key] = tick
+            return ring
+        last = self._last_tick[key]
+        if tick - last >= self.long_buckets:
+            ring[:] = [0] * self.long_buckets
+        else:
+            for t in range(last + 1, tick + 1):
+                ring[t % self.long_buckets] = 0
+        self._last_tick[key] = max(last, tick)
+        return ring
+
+    def record(self, guild_id: str, keyword: str, now: float | None = None) -> dict | None:
+        """
+        記錄一次命中；若短窗口速率達基準的 ratio 倍則回傳警示資訊，否則回傳 None。
+        """
+        now = time.time() if now is None else now
+        key = (guild_id, keyword)
+        tick = int(now // self.bucket_seconds)
+        ring = self._advance(key, tick)
+        ring[tick % self.long_buckets] += 1
+
+        # 啟動後需累積完整長窗口，才有可信的基準
+        if now - self._started_at < self.long_buckets * self.bucket_seconds:
             return None
-        finally:
-            await browser.close()
+
+        short_count = sum(
+            ring[(tick - i) % self.long_buckets] for i in range(self.short_buckets)
+        )
+        if short_count < self.min_count:
+            return None
+
+        baseline_buckets = self.long_buckets - self.short_buckets
+        baseline_count = sum(ring) - short_count
+        short_rate = short_count / self.short_buckets
+        # 基準為 0 時視為長窗口內出現過一次，避免除以零
+        baseline_rate = max(baseline_count, 1) / baseline_buckets
+        ratio = short_rate / baseline_rate
+        if ratio < self.ratio:
+            return None
+
+        last_alert = self._last_alert.get(key)
+        if last_alert is not None and now - last_alert < self.cooldown_seconds:
+            return None
+        self._last_alert[key] = now
+        return {
+            "guild_id": guild_id,
+            "keyword": keyword,
+            "short_count": short_count,
+            "baseline_count": baseline_count,
+            "ratio": ratio,
+        }
+
+    def forget(self, guild_id: str, keyword: str):
+        """關鍵字被移除時釋放其緩衝區。"""
+        key = (guild_id, keyword)
+        self._rings.pop(key, None)
+        self._last_tick.pop(key, None)
+        self._last_alert.pop(key, None)
+
+
+trend_detector = KeywordTrendDetector(
+    short_minutes=TREND_SHORT_MINUTES,
+    long_minutes=TREND_LONG_MINUTES,
+    ratio=TREND_RATIO,
+    min_count=TREND_MIN_COUNT,
+    cooldown_minutes=TREND_COOLDOWN_MINUTES,
+)
+
+
+def get_trend_channel(guild_id: int) -> discord.TextChannel | None:
+    """通知頻道只接收其所屬伺服器的趨勢，避免把其他伺服器的活動貼到這裡。"""
+    if not TREND_CHANNEL_ID:
+        return None
+    channel = client.get_channel(int(TREND_CHANNEL_ID))
+    if isinstance(channel, discord.TextChannel) and channel.guild.id == guild_id:
+        return channel
+    return None
+
+
+# create_task 的回傳值需保留參照，避免未完成就被回收
+_background_tasks: set[asyncio.Task] = set()
+
+
+def spawn_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def send_trend_alert(channel: discord.TextChannel, alert: dict):
+    embed = discord.Embed(
+        title=f"關鍵字「{alert['keyword']}」討論度急升",
+        description=(
+            f"最近 {trend_detector.short_buckets} 分鐘：**{alert['short_count']}** 次\n"
+            f"先前 {trend_detector.long_buckets - trend_detector.short_buckets} 分鐘："
+            f"{alert['baseline_count']} 次\n"
+            f"速率倍數：**{alert['ratio']:.1f}x**"
+        ),
+        color=0xED4245,
+    )
+    embed.set_footer(text="關鍵字趨勢 · 自動偵測")
+    embed.timestamp = datetime.now(timezone.utc)
+    try:
+        await channel.send(embed=embed)
+    except Exception as e:
+        print(f"[Trend] 發送趨勢通知失敗：{e}")
 
 
 # ---------- Background Task ----------
@@ -434,7 +1124,11 @@ async def check_threads_task():
         return
 
     try:
-        posts = await fetch_latest_threads_posts(THREADS_USERNAME)
+        posts = await fetch_latest_threads_posts(
+            THREADS_USERNAME,
+            cookies_path=THREADS_COOKIES_PATH,
+            profile_url=THREADS_PROFILE_URL.format(username=THREADS_USERNAME),
+        )
         if posts is None:
             print(f"[Threads] 無法取得 @{THREADS_USERNAME} 的貼文")
             return
@@ -487,6 +1181,23 @@ async def before_check_threads():
     await client.wait_until_ready()
 
 
+# ---------- Slash Commands — keyword autocomplete ----------
+
+async def keyword_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> list[app_commands.Choice[str]]:
+    if not interaction.guild_id:
+        return []
+    guild_id = str(interaction.guild_id)
+    await get_cached_keywords(guild_id)
+    # Discord 的選項名稱與值上限皆為 100 字
+    return [
+        app_commands.Choice(name=k, value=k)
+        for k in keyword_index.search(guild_id, current)
+        if len(k) <= 100
+    ]
+
+
 # ---------- Slash Commands — keyword tracking ----------
 
 @tree.command(name="track_add", description="新增追蹤關鍵字")
@@ -503,11 +1214,13 @@ async def track_add(interaction: discord.Interaction, keyword: str):
 @tree.command(name="track_remove", description="移除追蹤關鍵字")
 @app_commands.default_permissions(administrator=True)
 @app_commands.describe(keyword="要移除的文字")
+@app_commands.autocomplete(keyword=keyword_autocomplete)
 async def track_remove(interaction: discord.Interaction, keyword: str):
     if not interaction.guild:
         await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
         return
     await remove_keyword(str(interaction.guild_id), keyword)
+    trend_detector.forget(str(interaction.guild_id), keyword)
     await interaction.response.send_message(f"已移除關鍵字：`{keyword}`", ephemeral=True)
 
 
@@ -517,7 +1230,7 @@ async def track_list(interaction: discord.Interaction):
     if not interaction.guild:
         await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
         return
-    kws = await get_keywords(str(interaction.guild_id))
+    kws = await get_cached_keywords(str(interaction.guild_id))
     if not kws:
         await interaction.response.send_message("目前沒有追蹤關鍵字。", ephemeral=True)
         return
@@ -525,6 +1238,100 @@ async def track_list(interaction: discord.Interaction):
     await interaction.response.send_message(f"追蹤關鍵字：\n{lines}", ephemeral=True)
 
 
+IMPORT_MAX_BYTES = 1_000_000
+
+
+def normalize_keyword_list(items: list[str]) -> list[str]:
+    """去除空白與空字串，不分大小寫去重（保留第一次出現的寫法）。"""
+    seen: set[str] = set()
+    result: list[str] = []
+    for raw in items:
+        k = raw.strip()
+        if k and k.lower() not in seen:
+            seen.add(k.lower())
+            result.append(k)
+    return result
+
+
+@tree.command(name="track_import", description="批次匯入追蹤關鍵字（附檔每行一個，或以逗號分隔）")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(
+    file="文字檔，每行一個關鍵字",
+    keywords="以逗號分隔的關鍵字清單",
+    replace="移除清單中沒有的現有關鍵字（預設否）",
+    show_diff="附上變更明細檔（預設否）",
+)
+async def track_import(
+    interaction: discord.Interaction,
+    file: discord.Attachment | None = None,
+    keywords: str | None = None,
+    replace: bool = False,
+    show_diff: bool = False,
+):
+    if not interaction.guild:
+        await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
+        return
+    if file is None and not keywords:
+        await interaction.response.send_message("請附上檔案或填寫 keywords。", ephemeral=True)
+        return
+    if file is not None and file.size > IMPORT_MAX_BYTES:
+        await interaction.response.send_message("檔案過大（上限 1 MB）。", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    # 檔案每行一個（可含逗號）；文字參數以逗號分隔
+    items = re.split(r"[,，]", keywords) if keywords else []
+    if file is not None:
+        try:
+            items += (await file.read()).decode("utf-8-sig").splitlines()
+        except UnicodeDecodeError:
+            await interaction.followup.send("檔案需為 UTF-8 文字檔。", ephemeral=True)
+            return
+
+    guild_id = str(interaction.guild_id)
+    wanted = normalize_keyword_list(items)
+    # 空清單一律拒絕；否則 replace 會清空整個伺服器的關鍵字
+    if not wanted:
+        await interaction.followup.send("清單中沒有任何有效的關鍵字。", ephemeral=True)
+        return
+    existing = await get_cached_keywords(guild_id)
+    existing_lower = {k.lower() for k in existing}
+    wanted_lower = {k.lower() for k in wanted}
+    to_add = [k for k in wanted if k.lower() not in existing_lower]
+    to_remove = [k for k in existing if k.lower() not in wanted_lower] if replace else []
+    skipped = len(wanted) - len(to_add)
+
+    if to_add or to_remove:
+        await import_keywords(guild_id, to_add, to_remove)
+
+    summary = f"匯入完成：新增 {len(to_add)} 個、略過（已存在）{skipped} 個"
+    if replace:
+        summary += f"、移除 {len(to_remove)} 個"
+    diff_file = discord.utils.MISSING
+    if show_diff and (to_add or to_remove):
+        diff = "".join(f"+ {k}\n" for k in to_add) + "".join(f"- {k}\n" for k in to_remove)
+        diff_file = discord.File(io.BytesIO(diff.encode("utf-8")), filename="keywords.diff")
+    await interaction.followup.send(summary + "。", file=diff_file, ephemeral=True)
+
+
+@tree.command(name="track_export_keywords", description="匯出追蹤關鍵字為文字檔（每行一個）")
+@app_commands.default_permissions(administrator=True)
+async def track_export_keywords(interaction: discord.Interaction):
+    if not interaction.guild:
+        await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
+        return
+    kws = await get_cached_keywords(str(interaction.guild_id))
+    if not kws:
+        await interaction.response.send_message("目前沒有追蹤關鍵字。", ephemeral=True)
+        return
+    content = "".join(f"{k}\n" for k in kws)
+    await interaction.response.send_message(
+        f"共 {len(kws)} 個關鍵字。",
+        file=discord.File(io.BytesIO(content.encode("utf-8")), filename="keywords.txt"),
+        ephemeral=True,
+    )
+
+
 # ---------- Slash Commands — keyword stats ----------
 
 @tree.command(name="track_stats", description="查看關鍵字被特定人說過的次數")
@@ -533,6 +1340,7 @@ async def track_list(interaction: discord.Interaction):
     keyword="篩選特定關鍵字（留空 = 全部）",
     user="篩選特定成員（留空 = 全部）",
 )
+@app_commands.autocomplete(keyword=keyword_autocomplete)
 async def track_stats(
     interaction: discord.Interaction,
     keyword: str | None = None,
@@ -599,6 +1407,7 @@ async def track_stats(
     keyword="關鍵字",
     count="新的次數",
 )
+@app_commands.autocomplete(keyword=keyword_autocomplete)
 async def track_stats_set(
     interaction: discord.Interaction,
     user: discord.Member,
@@ -630,6 +1439,7 @@ async def track_stats_set(
     keyword="只清除此關鍵字的記錄（留空 = 不限）",
     user="只清除此成員的記錄（留空 = 不限）",
 )
+@app_commands.autocomplete(keyword=keyword_autocomplete)
 async def track_stats_reset(
     interaction: discord.Interaction,
     keyword: str | None = None,
@@ -654,6 +1464,104 @@ async def track_stats_reset(
     )
 
 
+# ---------- Slash Commands — emoji stats ----------
+
+@tree.command(name="emoji_stats", description="查看自訂 emoji 與貼圖使用排行")
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(
+    days="統計最近幾天（留空 = 30 天，0 = 全部）",
+    user="篩選特定成員（留空 = 全部）",
+)
+async def emoji_stats(
+    interaction: discord.Interaction,
+    days: int = 30,
+    user: discord.Member | None = None,
+):
+    if not interaction.guild:
+        await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
+        return
+    if days < 0:
+        await interaction.response.send_message("天數不能為負數。", ephemeral=True)
+        return
+
+    since_bucket = None
+    if days > 0:
+        since_bucket = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    emojis, stickers = await get_media_usage(
+        str(interaction.guild_id),
+        since_bucket=since_bucket,
+        author_id=str(user.id) if user else None,
+    )
+    if not emojis and not stickers:
+        await interaction.response.send_message("目前沒有符合條件的統計資料。", ephemeral=True)
+        return
+
+    period = f"最近 {days} 天" if days > 0 else "全部期間"
+    title = f"@{user.display_name} 的 emoji / 貼圖統計" if user else "emoji / 貼圖使用排行"
+    embed = discord.Embed(title=title, description=period, color=0x5865F2)
+    if emojis:
+        lines = [f"{i}. {e} — **{n}** 次" for i, (e, n) in enumerate(emojis, 1)]
+        embed.add_field(name="自訂 emoji", value="\n".join(lines)[:1024], inline=True)
+    if stickers:
+        lines = [f"{i}. `{name}` — **{n}** 次" for i, (name, n) in enumerate(stickers, 1)]
+        embed.add_field(name="貼圖", value="\n".join(lines)[:1024], inline=True)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+# ---------- Slash Commands — Debug ----------
+
+stall_detector = LoopStallDetector(threshold=STALL_THRESHOLD_MS / 1000)
+
+
+# 同一時間只允許一個取樣器執行
+_profile_lock = asyncio.Lock()
+
+
+@tree.command(name="debug_profile", description="對 bot 取樣分析指定秒數，回傳 collapsed stack 報告")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.describe(seconds="取樣秒數（1–60）")
+async def debug_profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 60]):
+    # default_permissions 在私訊中不生效，必須限定伺服器內使用
+    if not interaction.guild:
+        await interaction.response.send_message("此指令只能在伺服器內使用。", ephemeral=True)
+        return
+    if _profile_lock.locked():
+        await interaction.response.send_message("已有取樣正在進行，請稍後再試。", ephemeral=True)
+        return
+    async with _profile_lock:
+        await interaction.response.defer(ephemeral=True)
+        samples = await sample_stacks(seconds)
+    thread_total = sum(n for k, n in samples.items() if k.startswith("thread:"))
+    task_total = sum(n for k, n in samples.items() if k.startswith("task:"))
+    if not thread_total and not task_total:
+        await interaction.followup.send("沒有取得任何樣本。", ephemeral=True)
+        return
+
+    lines = ["**執行中的函式（各執行緒 self time）**"]
+    lines += [
+        f"`{n / thread_total:6.1%}` {name}"
+        for name, n in top_functions(samples, 8, prefix="thread:")
+    ]
+    lines.append("**等待中的 coroutine（task → await 鏈）**")
+    lines += [
+        f"`{n / task_total:6.1%}` {chain}" for chain, n in top_task_stacks(samples, 5)
+    ]
+    summary = "\n".join(lines)
+    if len(summary) > 1800:
+        summary = summary[:1800] + "\n…"
+    report = discord.File(
+        io.BytesIO(format_collapsed(samples).encode("utf-8")),
+        filename=f"profile-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.collapsed",
+    )
+    await interaction.followup.send(
+        f"取樣 {seconds} 秒（執行緒樣本 {thread_total}、task 樣本 {task_total}）：\n{summary}\n"
+        "附檔可用 flamegraph.pl 或 speedscope 開啟。",
+        file=report,
+        ephemeral=True,
+    )
+
+
 # ---------- Slash Commands — Help ----------
 
 @tree.command(name="help", description="顯示所有指令說明")
@@ -669,10 +1577,14 @@ async def help_cmd(interaction: discord.Interaction):
             "`/track_add <keyword>` — 新增追蹤關鍵字\n"
             "`/track_remove <keyword>` — 移除追蹤關鍵字\n"
             "`/track_list` — 列出目前所有追蹤關鍵字\n"
+            "`/track_import [file] [keywords] [replace] [show_diff]` — 批次匯入關鍵字\n"
+            "`/track_export_keywords` — 匯出關鍵字為文字檔\n"
             "`/track_stats [keyword] [user]` — 查看關鍵字被說次數統計\n"
             "`/track_stats_set <user> <keyword> <count>` — 手動設定次數\n"
             "`/track_stats_reset [keyword] [user]` — 清除次數記錄\n"
-            "訊息含有關鍵字、貼圖或自訂 emoji 時，自動記錄到資料庫"
+            "`/emoji_stats [days] [user]` — 查看自訂 emoji 與貼圖使用排行\n"
+            "訊息含有關鍵字、貼圖或自訂 emoji 時，自動記錄到資料庫；編輯或刪除訊息時同步修正次數\n"
+            "關鍵字短時間內出現次數急升時，自動通知至 `.env` 設定的頻道（僅限該頻道所屬伺服器）"
         ),
         inline=False,
     )
@@ -685,6 +1597,14 @@ async def help_cmd(interaction: discord.Interaction):
         ),
         inline=False,
     )
+    embed.add_field(
+        name="🛠️ 除錯",
+        value=(
+            "`/debug_profile <seconds>` — 取樣分析 bot 執行狀況，附上 flamegraph 用的報告\n"
+            "事件迴圈阻塞超過門檻時，自動將當下堆疊記錄到 log"
+        ),
+        inline=False,
+    )
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
@@ -700,7 +1620,11 @@ async def threads_check(interaction: discord.Interaction):
         return
 
     await interaction.response.defer()
-    posts = await fetch_latest_threads_posts(THREADS_USERNAME)
+    posts = await fetch_latest_threads_posts(
+        THREADS_USERNAME,
+        cookies_path=THREADS_COOKIES_PATH,
+        profile_url=THREADS_PROFILE_URL.format(username=THREADS_USERNAME),
+    )
 
     if posts is None:
         await interaction.followup.send(
@@ -734,14 +1658,13 @@ async def on_message(message: discord.Message):
         return
     if not message.guild:
         return
+    await db_ready.wait()
 
     guild_id = str(message.guild.id)
-    kws = await get_keywords(guild_id)
+    kws = await get_cached_keywords(guild_id)
 
     content = message.content or ""
-    content_lower = content.lower()
-
-    matched = [k for k in kws if k.lower() in content_lower]
+    matched = match_keywords(kws, content)
 
     stickers = [
         {
@@ -757,16 +1680,8 @@ async def on_message(message: discord.Message):
     if not matched and not stickers and not custom_emojis:
         return
 
-    # 累加每個符合的關鍵字次數
-    for kw in matched:
-        await increment_keyword_count(
-            guild_id,
-            str(message.author.id),
-            str(message.author),
-            kw,
-        )
-
-    await insert_log(
+    # log 列與計數在同一個 transaction 寫入；若編輯事件已搶先記錄此訊息，就不再重複累加
+    claimed = await record_message(
         guild_id=guild_id,
         channel_id=str(message.channel.id),
         message_id=str(message.id),
@@ -774,19 +1689,113 @@ async def on_message(message: discord.Message):
         author_tag=str(message.author),
         created_at=now_iso(),
         content=content,
-        matched_keywords=json.dumps(matched, ensure_ascii=False),
-        stickers=json.dumps(stickers, ensure_ascii=False),
-        emojis=json.dumps(custom_emojis, ensure_ascii=False),
+        matched=matched,
+        stickers=stickers,
+        emojis=custom_emojis,
         jump_url=message.jump_url,
     )
+    if not claimed:
+        return
+
+    # 趨勢偵測：純記憶體計數，不額外查詢資料庫
+    # 通知在背景發送，被限速時也不會卡住訊息處理
+    trend_channel = get_trend_channel(message.guild.id)
+    if trend_channel is not None:
+        for kw in matched:
+            alert = trend_detector.record(guild_id, kw)
+            if alert:
+                spawn_background(send_trend_alert(trend_channel, alert))
+
+
+@client.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    # 只處理內容有變動的編輯（嵌入預覽更新等事件不含 content）
+    if payload.guild_id is None or "content" not in payload.data:
+        return
+    author = payload.data.get("author") or {}
+    if not author.get("id") or author.get("bot"):
+        return
+    await db_ready.wait()
+
+    guild_id = str(payload.guild_id)
+    content = payload.data.get("content") or ""
+    matched = match_keywords(await get_cached_keywords(guild_id), content)
+    if await apply_message_edit(guild_id, str(payload.message_id), content, matched):
+        return
+
+    # 原訊息未被記錄：可能是 on_message 尚未寫入，或編輯後才出現關鍵字 / emoji。
+    # 以 record_message 搶先登記並累加；on_message 晚到時會登記失敗而略過。
+    custom_emojis = extract_custom_emojis(content)
+    stickers = []
+    for st in payload.data.get("sticker_items") or []:
+        try:
+            fmt = str(discord.StickerFormatType(st["format_type"]))
+        except (KeyError, ValueError):
+            fmt = None
+        stickers.append({"id": str(st["id"]), "name": st.get("name"), "format": fmt})
+    if not matched and not stickers and not custom_emojis:
+        return
+    author_id = str(author["id"])
+    discriminator = author.get("discriminator")
+    author_tag = (
+        author.get("username", "")
+        if discriminator in (None, "0")
+        else f"{author.get('username', '')}#{discriminator}"
+    )
+    # 以訊息發送時間歸檔（而非編輯時間），emoji / 貼圖才會落在正確的日期
+    created_at = discord.utils.snowflake_time(payload.message_id).isoformat()
+    claimed = await record_message(
+        guild_id=guild_id,
+        channel_id=str(payload.channel_id),
+        message_id=str(payload.message_id),
+        author_id=author_id,
+        author_tag=author_tag,
+        created_at=created_at,
+        content=content,
+        matched=matched,
+        stickers=stickers,
+        emojis=custom_emojis,
+        jump_url=f"https://discord.com/channels/{guild_id}/{payload.channel_id}/{payload.message_id}",
+    )
+    if not claimed:
+        # on_message 剛好搶先登記了原內容，改為套用差異
+        await apply_message_edit(guild_id, str(payload.message_id), content, matched)
+
+
+@client.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    if payload.guild_id is None:
+        return
+    await db_ready.wait()
+    await delete_logged_messages([str(payload.message_id)])
+
+
+@client.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    if payload.guild_id is None:
+        return
+    await db_ready.wait()
+    deleted = await delete_logged_messages([str(mid) for mid in payload.message_ids])
+    if deleted:
+        print(f"[Logs] 批次刪除 {len(payload.message_ids)} 則訊息，扣回 {deleted} 筆記錄")
+
+
+_migration_task: asyncio.Task | None = None
 
 
 @client.event
 async def on_ready():
     await init_db()
+    db_ready.set()
     await tree.sync()
+    global _migration_task
+    # on_ready 可能在重新連線時重複觸發，背景遷移只能同時執行一份
+    if _migration_task is None or _migration_task.done():
+        _migration_task = asyncio.create_task(run_pending_logs_migrations())
     if not check_threads_task.is_running():
         check_threads_task.start()
+    if not stall_detector.is_running():
+        stall_detector.start(asyncio.get_running_loop())
     print(f"Logged in as {client.user}  (ID: {client.user.id})")  # type: ignore[union-attr]
     print("------")
 
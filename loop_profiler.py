@@ -0,0 +1,159 @@
+"""
+事件迴圈診斷工具：取樣式 profiler 與卡頓偵測器。
+執行緒堆疊由獨立執行緒讀取 sys._current_frames()，不需要修改被量測的程式碼。
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit("/", 1)[-1].rsplit("\\", 1)[-1]
+    return f"{code.co_name} ({filename}:{frame.f_lineno})"
+
+
+def collapse_stack(frame) -> str:
+    """將 frame 轉為 flamegraph 使用的 collapsed 格式：root;...;leaf。"""
+    names: list[str] = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def collapse_coroutine(coro) -> str:
+    """
+    沿著 cr_await 走訪暫停中的 coroutine 鏈（外層 → 正在等待的最內層）。
+    Task.get_stack() 只給最外層 frame，看不出實際卡在哪個 await。
+    """
+    names: list[str] = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(_frame_name(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return ";".join(names)
+
+
+def _sample_threads(seconds: float, interval: float) -> Counter:
+    """取樣本執行緒以外所有執行緒的堆疊，以 thread:<名稱> 為根。"""
+    samples: Counter = Counter()
+    own_id = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            name = names.get(thread_id, str(thread_id))
+            samples[f"thread:{name};{collapse_stack(frame)}"] += 1
+        frames = frame = None  # 不保留 frame 參照
+        time.sleep(interval)
+    return samples
+
+
+async def _sample_tasks(seconds: float, interval: float, exclude: set) -> Counter:
+    """在事件迴圈上取樣所有等待中的 task 及其 await 鏈，以 task:<名稱> 為根。"""
+    samples: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for task in asyncio.all_tasks():
+            if task in exclude or task.done():
+                continue
+            chain = collapse_coroutine(task.get_coro())
+            if chain:
+                samples[f"task:{task.get_name()};{chain}"] += 1
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    取樣 seconds 秒，回傳 collapsed stack 計數：
+    - thread:*：各執行緒（含事件迴圈與 aiosqlite 等工作執行緒）正在執行的程式碼
+    - task:*：各 asyncio task 目前等待中的 coroutine 鏈，可看出是哪個 coroutine 在等 SQLite 或 Discord
+    執行緒取樣在另一個執行緒進行，事件迴圈照常運作以便被量測。
+    """
+    thread_task = asyncio.create_task(asyncio.to_thread(_sample_threads, seconds, interval))
+    # 排除 profiler 自己的 task，避免出現在報告中
+    task_samples = await _sample_tasks(
+        seconds, max(interval, 0.01), {asyncio.current_task(), thread_task}
+    )
+    return await thread_task + task_samples
+
+
+def format_collapsed(samples: Counter) -> str:
+    """輸出可直接交給 flamegraph.pl / speedscope 的 collapsed stack 文字。"""
+    return "".join(f"{stack} {n}\n" for stack, n in samples.most_common())
+
+
+def top_task_stacks(samples: Counter, n: int = 10) -> list[tuple[str, int]]:
+    """最常出現的 task await 鏈（外層 → 內層），以 " → " 連接以便閱讀。"""
+    stacks = [(k, c) for k, c in samples.items() if k.startswith("task:")]
+    stacks.sort(key=lambda item: item[1], reverse=True)
+    return [(k[len("task:"):].replace(";", " → "), c) for k, c in stacks[:n]]
+
+
+def top_functions(samples: Counter, n: int = 10, prefix: str = "") -> list[tuple[str, int]]:
+    """依堆疊最末端統計最常出現的函式；prefix 可篩選 "thread:" 或 "task:"。"""
+    leaves: Counter = Counter()
+    for stack, count in samples.items():
+        if stack.startswith(prefix):
+            leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(n)
+
+
+class LoopStallDetector:
+    """
+    事件迴圈每 interval 秒排一次心跳；監看執行緒發現心跳超過 threshold 秒未更新時，
+    代表有 callback 佔住迴圈，立即記錄迴圈執行緒當下的堆疊（每次卡頓只記一次）。
+    """
+
+    def __init__(self, threshold: float = 0.5, interval: float = 0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self._loop = None
+        self._loop_thread_id: int | None = None
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop):
+        """必須在事件迴圈執行緒中呼叫。"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        loop.call_soon(self._beat)
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-detector", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        if not self._stop.is_set():
+            self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            stalled_for = time.monotonic() - beat
+            if stalled_for < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "（無法取得堆疊）\n"
+            del frame
+            print(f"[Stall] 事件迴圈已阻塞 {stalled_for * 1000:.0f} ms，目前堆疊：\n{stack}", end="")
@@ -0,0 +1,121 @@
+"""
+Threads 個人頁面爬蟲。
+獨立於 bot.py，方便用 bench/ 內的本機 fixture server 離線測試與量測。
+"""
+import os
+import json
+from playwright.async_api import async_playwright
+
+
+async def fetch_latest_threads_posts(
+    username: str,
+    cookies_path: str | None = None,
+    profile_url: str | None = None,
+    settle_ms: int = 3_000,
+) -> list[dict] | None:
+    """
+    使用 Playwright 抓取 Threads 公開個人頁面的最新貼文（前 5 則）。
+    回傳 [{"post_id": str, "url": str, "text": str}, ...] 或 None（失敗時）。
+    回傳多則是為了跳過置頂貼文。
+    profile_url 可指向本機 fixture server（見 bench/），預設為 threads.net 個人頁。
+    """
+    if profile_url is None:
+        profile_url = f"https://www.threads.net/@{username}"
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            context = await browser.new_context(
+                user_agent=(
+                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                    "AppleWebKit/537.36 (KHTML, like Gecko) "
+                    "Chrome/124.0.0.0 Safari/537.36"
+                ),
+                locale="zh-TW",
+            )
+            # 載入已儲存的登入 Cookie
+            if cookies_path and os.path.exists(cookies_path):
+                with open(cookies_path, encoding="utf-8") as f:
+                    await context.add_cookies(json.load(f))
+                print(f"[Threads] 已載入 Cookie：{cookies_path}")
+            else:
+                print("[Threads] 未找到 Cookie 檔案，以未登入狀態嘗試")
+
+            page = await context.new_page()
+            await page.goto(profile_url, wait_until="networkidle", timeout=30_000)
+            await page.wait_for_timeout(settle_ms)
+
+            final_url = page.url
+            print(f"[Threads] 最終頁面 URL：{final_url}")
+
+            # 登入牆偵測
+            if any(k in final_url for k in ("login", "accounts", "signup")):
+                print("[Threads] 偵測到登入牆，無法在未登入狀態下查看此頁面")
+                return None
+
+            # 從 DOM 取得貼文清單，同時偵測置頂標記
+            # 將 username 傳入 JS，只抓屬於該用戶的貼文連結
+            raw: list[dict] = await page.evaluate("""
+                (username) => {
+                    const userPattern = '/@' + username + '/post/';
+
+                    function isPinned(linkEl) {
+                        let el = linkEl;
+                        for (let i = 0; i < 8; i++) {
+                            if (!el.parentElement) break;
+                            el = el.parentElement;
+                            // 超過單篇容器就停
+                            if (el.querySelectorAll('a[href*="/post/"]').length > 3) break;
+                            // 偵測 "Pinned" 文字節點
+                            const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+                            let node;
+                            while ((node = walker.nextNode())) {
+                                const t = node.textContent?.trim();
+                                if (t === 'Pinned' || t === '置頂') return true;
+                            }
+                            // 偵測 aria-label
+                            for (const a of el.querySelectorAll('[aria-label]')) {
+                                if (a.getAttribute('aria-label').toLowerCase().includes('pin')) return true;
+                            }
+                        }
+                        return false;
+                    }
+
+                    const seen = new Set();
+                    const results = [];
+                    for (const link of document.querySelectorAll('a[href*="/post/"]')) {
+                        // 只保留屬於此用戶的貼文連結，排除回覆、引用等其他用戶的連結
+                        if (!link.href.includes(userPattern)) continue;
+                        const m = link.href.match(/\\/post\\/([^/?#]+)/);
+                        if (!m) continue;
+                        const pid = m[1];
+                        if (seen.has(pid)) continue;
+                        seen.add(pid);
+                        results.push({ pid, pinned: isPinned(link) });
+                        if (results.length >= 10) break;
+                    }
+                    return results;
+                }
+            """, username)
+
+            if not raw:
+                page_title = await page.title()
+                print(f"[Threads] 找不到貼文連結，頁面標題：{page_title!r}")
+                return None
+
+            results: list[dict] = []
+            for item in raw:
+                pid: str = item["pid"]
+                pinned: bool = item["pinned"]
+                # 過濾掉非此用戶的貼文（若有的話）
+                clean_url = f"https://www.threads.com/@{username}/post/{pid}"
+                results.append({"post_id": pid, "url": clean_url, "pinned": pinned})
+
+            pinned_ids = [r["post_id"] for r in results if r["pinned"]]
+            print(f"[Threads] 共 {len(results)} 則，置頂：{pinned_ids}")
+            return results
+
+        except Exception as e:
+            print(f"[Threads] 抓取 @{username} 失敗：{e}")
+            return None
+        finally:
+            await browser.close()